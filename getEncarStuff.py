@@ -1,9 +1,9 @@
-import json
 import logging
 import os
 import platform
 import time
 
+import orjson
 import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -15,6 +15,17 @@ logging.basicConfig(level=logging.INFO)
 
 COOKIES_FILE = "encar_cookies.json"
 
+ENCAR_SEARCH_URL = "https://www.encar.com/fc/fc_carsearchlist.do?carType=for"
+API_URL = "https://api.encar.com/search/car/list/premium"
+API_PARAMS = {"count": "true", "q": "(And.Hidden.N._.CarType.N.)", "sr": "|ModifiedDate|20|20"}
+
+# TLS/HTTP2-отпечаток Chrome для curl_cffi и соответствующий ему User-Agent
+IMPERSONATE = "chrome131"
+IMPERSONATE_USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+)
+
 
 
 
@@ -38,13 +49,17 @@ def start_virtual_display_if_needed():
     return None
 
 
+# Пишем во временный файл и подменяем атомарно, чтобы runScraper не прочитал файл наполовину
 def save_browser_data(cookies, headers):
-    with open(COOKIES_FILE, "w") as f:
-        json.dump({
-            "saved_at": time.time(),
-            "cookies": cookies,
-            "headers": headers,
-        }, f)
+    buf = orjson.dumps({
+        "saved_at": time.time(),
+        "cookies": cookies,
+        "headers": headers,
+    })
+    tmp_file = COOKIES_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(buf)
+    os.replace(tmp_file, COOKIES_FILE)
 
 
 
@@ -52,14 +67,53 @@ def load_cookies():
     if not os.path.exists(COOKIES_FILE):
         return None
 
-    with open(COOKIES_FILE, "r") as f:
-        data = json.load(f)
+    with open(COOKIES_FILE, "rb") as f:
+        data = orjson.loads(f.read())
 
     logging.info("✅ Используем сохраненные куки")
     return data["cookies"]
 
 
+# Получаем куки без браузера: curl_cffi повторяет TLS-отпечаток Chrome
+def fetch_cookies_without_browser():
+    try:
+        from curl_cffi import requests as cffi_requests
+    except ImportError:
+        logging.info("ℹ️ curl_cffi not installed, falling back to Selenium")
+        return None
+
+    headers = {
+        "User-Agent": IMPERSONATE_USER_AGENT,
+        "Referer": ENCAR_SEARCH_URL,
+    }
+
+    try:
+        session = cffi_requests.Session(impersonate=IMPERSONATE)
+        session.get(ENCAR_SEARCH_URL, headers={"User-Agent": IMPERSONATE_USER_AGENT}, timeout=10)
+        resp = session.get(API_URL, params=API_PARAMS, headers=headers, timeout=10)
+        # Обходим jar, а не items(): одно имя куки на www и api даёт CookieConflict
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+            for c in session.cookies.jar
+        ]
+    except Exception as e:
+        logging.error(f"❌ curl_cffi request failed: {e}")
+        return None
+
+    # 200 здесь получен с TLS-отпечатком Chrome, работу кук с httpx в парсере он не гарантирует
+    if resp.status_code != 200 or not cookies:
+        logging.warning(f"⚠️ curl_cffi got API status {resp.status_code} and {len(cookies)} cookies, falling back to Selenium")
+        return None
+
+    save_browser_data(cookies, headers)
+    logging.info(f"🟢 Got {len(cookies)} cookies without browser")
+    return cookies
+
+
 def test():
+    if fetch_cookies_without_browser():
+        return
+
     display = start_virtual_display_if_needed()
 
     options = Options()
@@ -91,7 +145,7 @@ def test():
     try:
 
         print("1. Opening Encar page...")
-        url = "https://www.encar.com/fc/fc_carsearchlist.do?carType=for#!%7B%22action%22%3A%22(And.Hidden.N._.CarType.N.)%22%2C%22toggle%22%3A%7B%7D%2C%22layer%22%3A%22%22%2C%22sort%22%3A%22ModifiedDate%22%2C%22page%22%3A1%2C%22limit%22%3A20%2C%22searchKey%22%3A%22%22%2C%22loginCheck%22%3Afalse%7D"
+        url = f"{ENCAR_SEARCH_URL}#!%7B%22action%22%3A%22(And.Hidden.N._.CarType.N.)%22%2C%22toggle%22%3A%7B%7D%2C%22layer%22%3A%22%22%2C%22sort%22%3A%22ModifiedDate%22%2C%22page%22%3A1%2C%22limit%22%3A20%2C%22searchKey%22%3A%22%22%2C%22loginCheck%22%3Afalse%7D"
         driver.get(url)
         time.sleep(5)
         print(f"   Page title: {driver.title}")
@@ -111,10 +165,7 @@ def test():
 
         session.headers.update(new_headers)
 
-        api_url = "https://api.encar.com/search/car/list/premium"
-        params = {"count": "true", "q": "(And.Hidden.N._.CarType.N.)", "sr": "|ModifiedDate|20|20"}
-
-        resp = session.get(api_url, params=params, timeout=10)
+        resp = session.get(API_URL, params=API_PARAMS, timeout=10)
         print(f"   API status: {resp.status_code}")
         if resp.status_code == 200:
             save_browser_data(cookies, new_headers)
@@ -1,13 +1,20 @@
+import asyncio
+import atexit
 import json
 import logging
+import logging.handlers
 import os
+import queue
 import sqlite3
 import sys
 import time
-from datetime import datetime
-from typing import Dict, List, Optional, Set, Tuple
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
-import requests
+import httpx
+import msgspec
+import orjson
 
 COOKIES_FILE = "encar_cookies.json"
 LOG_FILE = "encar_truck_scraper.log"
@@ -18,12 +25,64 @@ START_YEAR = 2025
 MIN_YEAR = 2008
 PAGE_SIZE = 1000
 OFFSET_STEP = PAGE_SIZE
+DOUBLE_PAGES_TO_SKIP = 10  # Без Count: подряд страниц без новых Id до перехода к следующему году
 INITIAL_OFFSET = 0
 REQUEST_TIMEOUT = 15
-REQUEST_PAUSE_SECONDS = 1.6
-DOUBLE_PAGES_TO_SKIP = 10
+REQUEST_PAUSE_SECONDS = 1.6  # Начальный интервал между запросами, пока задержка ответов API не измерена
+MIN_REQUEST_PAUSE_SECONDS = 0.05
+MAX_REQUEST_PAUSE_SECONDS = 30.0
+LATENCY_EWMA_ALPHA = 0.2
+THROTTLE_STATUS_CODES = (429, 503)
+MAX_THROTTLE_RETRIES = 5
+MAX_CONCURRENT_REQUESTS = 8  # Одновременных запросов к API
+MAX_KEEPALIVE_CONNECTIONS = 20
+MAX_CONNECTIONS = 100
+CONNECT_RETRIES = 2  # Повторы установки соединения на уровне транспорта
+SAVE_QUEUE_SIZE = 2 * MAX_CONCURRENT_REQUESTS  # Страниц, ожидающих записи в БД
 CYCLE_PAUSE = 60  # Пауза между циклами парсинга в секундах
 
+CREATE_CARS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS cars (
+        id TEXT PRIMARY KEY,
+        condition TEXT,
+        manufacturer TEXT,
+        model TEXT,
+        badge TEXT,
+        transmission TEXT,
+        fuel_type TEXT,
+        year REAL,
+        form_year TEXT,
+        mileage REAL,
+        price REAL,
+        sell_type TEXT,
+        modified_date TEXT,
+        collected_at INTEGER
+    )
+"""
+
+# Дубли отсекает сама SQLite: строка меняется только для новых авто и при смене ModifiedDate
+INSERT_CAR_SQL = """
+    INSERT INTO cars
+    (id, condition, manufacturer, model, badge, transmission, fuel_type,
+     year, form_year, mileage, price, sell_type, modified_date, collected_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        condition = excluded.condition,
+        manufacturer = excluded.manufacturer,
+        model = excluded.model,
+        badge = excluded.badge,
+        transmission = excluded.transmission,
+        fuel_type = excluded.fuel_type,
+        year = excluded.year,
+        form_year = excluded.form_year,
+        mileage = excluded.mileage,
+        price = excluded.price,
+        sell_type = excluded.sell_type,
+        modified_date = excluded.modified_date,
+        collected_at = excluded.collected_at
+    WHERE cars.modified_date IS NOT excluded.modified_date
+"""
+
 
 def setup_logging() -> logging.Logger:
     logger = logging.getLogger("encar_truck_scraper")
@@ -36,26 +95,49 @@ def setup_logging() -> logging.Logger:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
     file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+
+    # Запись в консоль и файл идёт в отдельном потоке, парсер только кладёт записи в очередь
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
     logger.debug("Логирование инициализировано")
     return logger
 
 
-def load_cookies(logger: logging.Logger) -> Optional[List[Dict]]:
-    if not os.path.exists(COOKIES_FILE):
+CookiesAndHeaders = Tuple[List[Dict], Dict[str, str]]
+
+_cookies_file_cache: Optional[Tuple[int, CookiesAndHeaders]] = None
+
+
+def load_cookies_and_headers(logger: logging.Logger) -> Optional[CookiesAndHeaders]:
+    """Читает куки и headers из файла за один разбор, повторно - только после изменения файла на диске"""
+    global _cookies_file_cache
+
+    try:
+        mtime = os.stat(COOKIES_FILE).st_mtime_ns
+    except FileNotFoundError:
         logger.error("Файл с куками не найден: %s", COOKIES_FILE)
         return None
+    except OSError as exc:
+        logger.error("Не удалось загрузить куки из %s: %s", COOKIES_FILE, exc)
+        return None
+
+    if _cookies_file_cache is not None and _cookies_file_cache[0] == mtime:
+        return _cookies_file_cache[1]
 
     try:
-        with open(COOKIES_FILE, "r", encoding="utf-8") as file:
-            data = json.load(file)
-    except (OSError, json.JSONDecodeError) as exc:
+        with open(COOKIES_FILE, "rb") as file:
+            data = orjson.loads(file.read())
+    except (OSError, orjson.JSONDecodeError) as exc:
         logger.error("Не удалось загрузить куки из %s: %s", COOKIES_FILE, exc)
         return None
 
@@ -64,50 +146,81 @@ def load_cookies(logger: logging.Logger) -> Optional[List[Dict]]:
         logger.error("В файле %s отсутствуют куки", COOKIES_FILE)
         return None
 
-    logger.info("Используем сохраненные куки (%d шт.)", len(cookies))
-    return cookies
-
-def load_headers(logger: logging.Logger):
-    if not os.path.exists(COOKIES_FILE):
-        logger.error("Файл с куками не найден: %s", COOKIES_FILE)
-        return None
-
-    try:
-        with open(COOKIES_FILE, "r", encoding="utf-8") as file:
-            data = json.load(file)
-    except (OSError, json.JSONDecodeError) as exc:
-        logger.error("Не удалось загрузить headers из %s: %s", COOKIES_FILE, exc)
-        return None
-
     headers = data.get("headers")
     if not headers:
-        logger.error("В файле %s отсутствуют куки", COOKIES_FILE)
+        logger.error("В файле %s отсутствуют headers", COOKIES_FILE)
         return None
 
-    logger.info("Используем сохраненные headers (%d шт.)", len(headers))
-    return headers
+    logger.info("Используем сохраненные куки (%d шт.) и headers (%d шт.)", len(cookies), len(headers))
+    _cookies_file_cache = (mtime, (cookies, headers))
+    return cookies, headers
 
 
-def create_session_with_cookies(cookies: List[Dict], logger: logging.Logger) -> requests.Session:
-    session = requests.Session()
-    session.trust_env = False
-    session.proxies.clear()
-    session.headers.update(load_headers(logger))
+def create_session_with_cookies(
+        cookies: List[Dict],
+        saved_headers: Dict[str, str],
+        logger: logging.Logger,
+) -> httpx.AsyncClient:
+    # Accept-Encoding выставляет сам httpx - только те сжатия, которые он умеет распаковать
+    headers = {
+        name: value
+        for name, value in saved_headers.items()
+        if name.lower() != "accept-encoding"
+    }
+
+    # Клиент ходит только в api.encar.com, поэтому domain/path кук не нужны: собираем
+    # заголовок Cookie один раз, вместо обхода cookie jar на каждый запрос
+    headers["Cookie"] = "; ".join(
+        f"{cookie['name']}={cookie.get('value', '')}" for cookie in cookies if cookie.get("name")
+    )
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=MAX_CONNECTIONS,
+        ),
+        retries=CONNECT_RETRIES,
+    )
+    client = httpx.AsyncClient(
+        headers=headers,
+        transport=transport,
+        timeout=REQUEST_TIMEOUT,
+        trust_env=False,
+    )
+
+    accept_encoding = client.headers.get("Accept-Encoding", "")
+    if "br" not in accept_encoding:
+        logger.warning("Пакет brotli не установлен, ответы API будут сжаты только gzip (%s)", accept_encoding)
+
+    return client
+
+
+_client: Optional[httpx.AsyncClient] = None
+_client_cookies_and_headers: Optional[CookiesAndHeaders] = None
 
-    for cookie in cookies:
-        name = cookie.get("name")
-        value = cookie.get("value")
-        if not name:
-            continue
-        session.cookies.set(
-            name,
-            value,
-            domain=cookie.get("domain"),
-            path=cookie.get("path", "/"),
-            secure=cookie.get("secure", False),
-        )
 
-    return session
+async def get_client(cookies_and_headers: CookiesAndHeaders, logger: logging.Logger) -> httpx.AsyncClient:
+    """Возвращает общий для всех циклов клиент, пересоздавая его только при смене кук или headers"""
+    global _client, _client_cookies_and_headers
+
+    if _client is None or cookies_and_headers != _client_cookies_and_headers:
+        if _client is not None:
+            await _client.aclose()
+        _client = create_session_with_cookies(*cookies_and_headers, logger)
+        _client_cookies_and_headers = cookies_and_headers
+        logger.debug("Создан новый HTTP клиент")
+
+    return _client
+
+
+async def close_client() -> None:
+    global _client, _client_cookies_and_headers
+
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_cookies_and_headers = None
 
 
 def build_year_range(year: int) -> str:
@@ -116,40 +229,125 @@ def build_year_range(year: int) -> str:
     return f"{start}..{end}"
 
 
-def normalize_car_id(raw_id: object) -> Optional[Tuple[str, object]]:
-    if raw_id is None:
-        return None
+def build_page_url_prefix(year_range: str) -> str:
+    """Собирает URL запроса для диапазона годов целиком, кроме offset и размера страницы"""
+    query = urllib.parse.quote(f"(And.Hidden.N._.Year.range({year_range}).)", safe="")
+    return f"{BASE_API_URL}?count=true&q={query}&sr=%7CModifiedDate%7C"
 
-    raw_str = str(raw_id).strip()
-    if not raw_str:
-        return None
 
-    if raw_str.isdigit():
-        stored_value: object = int(raw_str)
-    else:
-        stored_value = raw_str
+class CarRecord(msgspec.Struct):
+    """Поля объявления, которые сохраняются в БД; остальные ключи ответа API не разбираются"""
+    Id: Any = None
+    Condition: Any = None
+    Manufacturer: Any = None
+    Model: Any = None
+    Badge: Any = None
+    Transmission: Any = None
+    FuelType: Any = None
+    Year: Any = None
+    FormYear: Any = None
+    Mileage: Any = None
+    Price: Any = None
+    SellType: Any = None
+    ModifiedDate: Any = None
+
 
-    return raw_str, stored_value
+class SearchPage(msgspec.Struct):
+    Count: Optional[int] = None
+    SearchResults: List[CarRecord] = msgspec.field(default_factory=list)
 
 
-def fetch_page(
-        session: requests.Session,
+_search_page_decoder = msgspec.json.Decoder(SearchPage)
+
+
+class RequestPacer:
+    """Ограничивает число одновременных запросов и темп их отправки, подстраиваясь под задержку ответов API"""
+
+    def __init__(self, max_concurrent: int) -> None:
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.latency_ewma: Optional[float] = None
+        self.next_request_at = 0.0
+        self.backoff_until = 0.0
+
+    @property
+    def pause(self) -> float:
+        """Минимальный интервал между стартами запросов"""
+        if self.latency_ewma is None:
+            return REQUEST_PAUSE_SECONDS
+        return min(MAX_REQUEST_PAUSE_SECONDS, max(MIN_REQUEST_PAUSE_SECONDS, 0.5 * self.latency_ewma))
+
+    def record_latency(self, latency: float) -> None:
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+    async def wait_turn(self) -> None:
+        """Ждёт времени старта по часам, а не фиксированную паузу после ответа: время самого запроса уже засчитано"""
+        while True:
+            now = time.monotonic()
+            start_at = max(self.next_request_at, now)
+            self.next_request_at = start_at + self.pause
+            await asyncio.sleep(start_at - now)
+            # Пока спали, ответ с 429/503 мог объявить паузу - занятое до неё время старта уже не годится
+            if self.backoff_until <= start_at:
+                return
+
+    def throttled(self, response: httpx.Response, attempt: int) -> float:
+        """Откладывает все следующие запросы на паузу перед повтором и замедляет темп, возвращает паузу"""
+        delay = REQUEST_PAUSE_SECONDS * 2 ** attempt
+        retry_after = response.headers.get("Retry-After", "").strip()
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+
+        now = time.monotonic()
+        # Замедляемся один раз на всплеск ограничений: пока идёт пауза, ответы остальных слотов темп не удваивают
+        if self.backoff_until <= now:
+            self.latency_ewma = min(2 * MAX_REQUEST_PAUSE_SECONDS, 2 * (self.latency_ewma or REQUEST_PAUSE_SECONDS))
+        self.backoff_until = max(self.backoff_until, now + delay)
+        self.next_request_at = max(self.next_request_at, self.backoff_until)
+        return delay
+
+
+async def fetch_page(
+        client: httpx.AsyncClient,
+        pacer: RequestPacer,
         logger: logging.Logger,
         year_range: str,
+        url_prefix: str,
         offset: int,
-) -> Optional[List[Dict]]:
-    params = {
-        "count": "true",
-        "q": f"(And.Hidden.N._.Year.range({year_range}).)",
-        "sr": f"|ModifiedDate|{offset}|{PAGE_SIZE}",
-    }
+) -> Optional[Tuple[List[CarRecord], Optional[int]]]:
+    """Возвращает автомобили страницы и общее число автомобилей в диапазоне (поле Count, если API его прислал)"""
     logger.info("Запрос год %s, offset %d", year_range, offset)
+    url = f"{url_prefix}{offset}%7C{PAGE_SIZE}"
 
-    try:
-        response = session.get(BASE_API_URL, params=params, timeout=REQUEST_TIMEOUT)
-    except requests.RequestException as exc:
-        logger.error("HTTP ошибка при запросе (%s, offset %d): %s", year_range, offset, exc)
-        return None
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        try:
+            async with pacer.semaphore:
+                # Очередь старта занимаем внутри семафора, чтобы расписание не уходило далеко вперёд
+                await pacer.wait_turn()
+                started = time.monotonic()
+                response = await client.get(url)
+        except httpx.HTTPError as exc:
+            logger.error("HTTP ошибка при запросе (%s, offset %d): %s", year_range, offset, exc)
+            return None
+
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            pacer.record_latency(time.monotonic() - started)
+            break
+
+        if attempt == MAX_THROTTLE_RETRIES:
+            # Повтора не будет - не сдвигаем общее расписание, ответ уйдёт в ошибку ниже
+            break
+
+        delay = pacer.throttled(response, attempt)
+        logger.warning(
+            "API ограничивает запросы (статус %s, %s offset %d), пауза %.1f секунд",
+            response.status_code,
+            year_range,
+            offset,
+            delay,
+        )
 
     if response.status_code != 200:
         logger.error(
@@ -157,217 +355,346 @@ def fetch_page(
             response.status_code,
             year_range,
             offset,
-            response.text[:500],
+            response.content[:500].decode("utf-8", "replace"),
         )
         return None
 
     try:
-        payload = response.json()
-    except json.JSONDecodeError as exc:
+        payload = _search_page_decoder.decode(response.content)
+    except msgspec.DecodeError as exc:
         logger.error("Не удалось разобрать JSON (%s, offset %d): %s", year_range, offset, exc)
         return None
 
-    results = payload.get("SearchResults", [])
-    logger.info("Получено результатов: %d", len(results))
-    return results
+    results = payload.SearchResults
+    logger.info("Получено результатов: %d (всего в диапазоне: %s)", len(results), payload.Count)
+    return results, payload.Count
 
 
 
 
-def init_database(logger: logging.Logger) -> None:
-    """Инициализирует базу данных SQLite с таблицей для автомобилей"""
+def init_database(logger: logging.Logger) -> Optional[sqlite3.Connection]:
+    """Открывает базу данных SQLite на всё время работы и создаёт таблицу для автомобилей"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS cars (
-                id TEXT PRIMARY KEY,
-                condition TEXT,
-                manufacturer TEXT,
-                model TEXT,
-                badge TEXT,
-                transmission TEXT,
-                fuel_type TEXT,
-                year REAL,
-                form_year TEXT,
-                mileage REAL,
-                price REAL,
-                sell_type TEXT,
-                modified_date TEXT,
-                collected_at TEXT,
-                UNIQUE(id)
-            )
-        """)
-        
+        # Запись идёт из рабочего потока db_writer, но всегда только из одного за раз
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute(CREATE_CARS_TABLE_SQL)
         conn.commit()
-        conn.close()
+        migrate_collected_at(logger, conn)
         logger.info("База данных инициализирована: %s", DB_FILE)
+        return conn
     except sqlite3.Error as exc:
         logger.error("Ошибка при инициализации базы данных: %s", exc)
+        return None
+
+
+def migrate_collected_at(logger: logging.Logger, conn: sqlite3.Connection) -> None:
+    """Переводит collected_at из ISO-строки локального времени в Unix-время (INTEGER) в старых базах"""
+    column_types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(cars)")}
+    if column_types.get("collected_at", "").upper() != "TEXT":
+        return
+
+    # Тип столбца в SQLite не меняется, поэтому пересобираем таблицу в одной транзакции
+    logger.info("Переводим cars.collected_at в INTEGER (Unix-время)")
+    try:
+        conn.executescript(f"""
+            BEGIN;
+            ALTER TABLE cars RENAME TO cars_old;
+            {CREATE_CARS_TABLE_SQL};
+            INSERT INTO cars
+            SELECT id, condition, manufacturer, model, badge, transmission, fuel_type,
+                   year, form_year, mileage, price, sell_type, modified_date,
+                   CAST(strftime('%s', collected_at, 'utc') AS INTEGER)
+            FROM cars_old;
+            DROP TABLE cars_old;
+            COMMIT;
+        """)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+@lru_cache(maxsize=1024)
+def _dump_condition(condition: Tuple) -> str:
+    return json.dumps(list(condition), ensure_ascii=False)
+
+
+def encode_condition(condition: Any) -> Optional[str]:
+    """Сериализует Condition в JSON, повторяющиеся наборы берутся из кэша"""
+    if not condition:
+        return None
+
+    if isinstance(condition, list):
+        try:
+            return _dump_condition(tuple(condition))
+        except TypeError:
+            # Нехешируемые элементы - сериализуем без кэша
+            pass
+
+    return json.dumps(condition, ensure_ascii=False)
 
 
-def extract_car_data(car: Dict) -> Optional[Tuple]:
-    """Извлекает данные об автомобиле для сохранения в БД"""
-    car_id = str(car.get("Id", ""))
+def extract_car_data(car: CarRecord, collected_at: int) -> Optional[Tuple]:
+    """Извлекает данные об автомобиле в виде готовой строки для INSERT_CAR_SQL"""
+    raw_id = car.Id
+    if raw_id is None:
+        return None
+
+    car_id = str(raw_id)
     if not car_id:
         return None
     
-    condition = json.dumps(car.get("Condition", []), ensure_ascii=False) if car.get("Condition") else None
-    manufacturer = car.get("Manufacturer")
-    model = car.get("Model")
-    badge = car.get("Badge")
-    transmission = car.get("Transmission")
-    fuel_type = car.get("FuelType")
-    year = car.get("Year")
-    form_year = car.get("FormYear")
-    mileage = car.get("Mileage")
-    price = car.get("Price")
-    sell_type = car.get("SellType")
-    modified_date = car.get("ModifiedDate")
+    condition = encode_condition(car.Condition)
+    manufacturer = car.Manufacturer
+    model = car.Model
+    badge = car.Badge
+    transmission = car.Transmission
+    fuel_type = car.FuelType
+    year = car.Year
+    form_year = car.FormYear
+    mileage = car.Mileage
+    price = car.Price
+    sell_type = car.SellType
+    modified_date = car.ModifiedDate
     
     return (
         car_id, condition, manufacturer, model, badge, transmission, fuel_type,
-        year, form_year, mileage, price, sell_type, modified_date
+        year, form_year, mileage, price, sell_type, modified_date, collected_at
     )
 
 
-def save_cars_to_db_batch(logger: logging.Logger, cars: List[Dict], collected_at: str) -> int:
-    """Сохраняет список автомобилей в SQLite батчем"""
-    if not cars:
+def build_car_rows(cars: List[CarRecord], collected_at: int) -> List[Tuple]:
+    """Готовит строки для INSERT_CAR_SQL: один Id - одна строка, записи без Id отбрасываются"""
+    # Повторы одного Id внутри страницы схлопываем до SQLite, последняя запись побеждает
+    unique_cars = {car.Id: car for car in cars}.values()
+    return [row for row in (extract_car_data(car, collected_at) for car in unique_cars) if row is not None]
+
+
+def save_cars_to_db_batch(
+        logger: logging.Logger,
+        conn: sqlite3.Connection,
+        rows: List[Tuple],
+) -> Optional[int]:
+    """Сохраняет строки в SQLite батчем одной транзакцией, возвращает число новых или изменённых, None при ошибке"""
+    if not rows:
         return 0
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        saved_count = 0
-        for car in cars:
-            car_data = extract_car_data(car)
-            if not car_data:
-                continue
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO cars 
-                (id, condition, manufacturer, model, badge, transmission, fuel_type, 
-                 year, form_year, mileage, price, sell_type, modified_date, collected_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, car_data + (collected_at,))
-            saved_count += 1
-        
-        conn.commit()
-        conn.close()
-        return saved_count
+        with conn:
+            cursor = conn.executemany(INSERT_CAR_SQL, rows)
+        return cursor.rowcount
     except sqlite3.Error as exc:
         logger.error("Ошибка при сохранении автомобилей в БД: %s", exc)
-        return 0
+        return None
 
 
+def save_page(
+        logger: logging.Logger,
+        conn: sqlite3.Connection,
+        cars: List[CarRecord],
+        collected_at: int,
+) -> Tuple[int, Optional[int]]:
+    """Готовит строки страницы и сохраняет их, возвращает число строк и число новых или изменённых (None при ошибке)"""
+    rows = build_car_rows(cars, collected_at)
+    return len(rows), save_cars_to_db_batch(logger, conn, rows)
 
 
-def scrape_trucks(logger: logging.Logger) -> None:
-    cookies = load_cookies(logger)
-    if not cookies:
+
+
+async def db_writer(logger: logging.Logger, conn: sqlite3.Connection, save_queue: asyncio.Queue) -> None:
+    """Единственный писатель в БД: сохраняет страницы из очереди в рабочем потоке, пока не придёт None"""
+    while True:
+        item = await save_queue.get()
+        if item is None:
+            return
+
+        page_results, collected_at = item
+        try:
+            # Подготовка строк тоже уходит в рабочий поток, чтобы не занимать event loop
+            saved_count, changed_count = await asyncio.to_thread(save_page, logger, conn, page_results, collected_at)
+        except Exception as exc:
+            # Писатель должен жить до конца цикла, иначе очередь заполнится и парсинг встанет
+            logger.error("Ошибка при записи страницы в БД: %s", exc, exc_info=True)
+            continue
+
+        if changed_count is None:
+            continue
+
+        logger.info(
+            "Сохранено в БД: %d автомобилей (новых или изменённых: %d)",
+            saved_count, changed_count
+        )
+
+
+async def process_page(save_queue: asyncio.Queue, page_results: List[CarRecord]) -> None:
+    """Ставит автомобили страницы в очередь на запись в БД"""
+    if page_results:
+        await save_queue.put((page_results, int(time.time())))
+
+
+async def scrape_sequentially(
+        client: httpx.AsyncClient,
+        pacer: RequestPacer,
+        logger: logging.Logger,
+        save_queue: asyncio.Queue,
+        year_range: str,
+        url_prefix: str,
+        page_results: List[CarRecord],
+) -> None:
+    """Запасной обход без Count: запрашивает страницы по одной до пустой или до серии страниц из одних дублей"""
+    offset = INITIAL_OFFSET
+    pages = 1
+    cars = len(page_results)
+    seen_ids = {car.Id for car in page_results}
+    repeat_pages = 0
+    while page_results:
+        offset += OFFSET_STEP
+        page = await fetch_page(client, pacer, logger, year_range, url_prefix, offset)
+        if page is None:
+            logger.warning("Пропускаем offset %d для диапазона %s из-за ошибки", offset, year_range)
+            break
+
+        page_results = page[0]
+        if not page_results:
+            break
+
+        pages += 1
+        cars += len(page_results)
+        await process_page(save_queue, page_results)
+
+        # API бывает отдаёт одни и те же страницы бесконечно - без Count останавливаемся по дублям
+        page_ids = {car.Id for car in page_results}
+        repeat_pages = 0 if page_ids - seen_ids else repeat_pages + 1
+        seen_ids |= page_ids
+        if repeat_pages >= DOUBLE_PAGES_TO_SKIP:
+            logger.info(
+                "Повтор дублей! %s (offset %d), переходим к следующему году",
+                year_range,
+                offset,
+            )
+            break
+
+    logger.info(
+        "=== Диапазон %s завершен: страниц %d, автомобилей %d ===",
+        year_range,
+        pages,
+        cars,
+    )
+
+
+async def scrape_year(
+        client: httpx.AsyncClient,
+        pacer: RequestPacer,
+        logger: logging.Logger,
+        save_queue: asyncio.Queue,
+        year: int,
+) -> None:
+    year_range = build_year_range(year)
+    url_prefix = build_page_url_prefix(year_range)
+    logger.info("=== Обработка диапазона %s ===", year_range)
+
+    async def scrape_offset(offset: int) -> Optional[int]:
+        """Возвращает число полученных автомобилей или None, если страницу пропустили"""
+        page = await fetch_page(client, pacer, logger, year_range, url_prefix, offset)
+        if page is None:
+            logger.warning("Пропускаем offset %d для диапазона %s из-за ошибки", offset, year_range)
+            return None
+        await process_page(save_queue, page[0])
+        return len(page[0])
+
+    first_page = await fetch_page(client, pacer, logger, year_range, url_prefix, INITIAL_OFFSET)
+    if first_page is None:
+        logger.warning("Пропускаем диапазон %s из-за ошибки", year_range)
         return
 
-    session = create_session_with_cookies(cookies, logger)
-    
-    # Множество ID для отслеживания дублей в текущем цикле парсинга
-    seen_ids_in_cycle: Set[str] = set()
+    page_results, total = first_page
+    await process_page(save_queue, page_results)
 
-    for year in range(START_YEAR, MIN_YEAR - 1, -1):
-        year_range = build_year_range(year)
-        logger.info("=== Обработка диапазона %s ===", year_range)
+    if total is None:
+        logger.warning("API не вернул Count для диапазона %s, идём по страницам до пустой", year_range)
+        await scrape_sequentially(client, pacer, logger, save_queue, year_range, url_prefix, page_results)
+        return
 
-        offset = INITIAL_OFFSET
+    # Число страниц известно из Count первой страницы - остальные запрашиваем параллельно
+    offsets = range(INITIAL_OFFSET + OFFSET_STEP, total, OFFSET_STEP)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(scrape_offset(offset)) for offset in offsets]
+    fetched = [task.result() for task in tasks if task.result() is not None]
+
+    logger.info(
+        "=== Диапазон %s завершен: страниц %d, автомобилей %d (по Count: %d) ===",
+        year_range,
+        len(fetched) + 1,
+        len(page_results) + sum(fetched),
+        total,
+    )
 
-        # Счетчик полностью повторяющейся выборки
-        all_repeat_count = DOUBLE_PAGES_TO_SKIP
-        while True:
 
-            page_results = fetch_page(session, logger, year_range, offset)
-            if page_results is None:
-                logger.warning("Пропускаем offset %d для диапазона %s из-за ошибки", offset, year_range)
-                break
-
-            if not page_results:
-                logger.info(
-                    "Данных больше нет для диапазона %s (offset %d), переходим к следующему году",
-                    year_range,
-                    offset,
-                )
-                break
-
-            new_count = 0
-            repeat_count = 0
-            collected_at = datetime.now().isoformat()
-            cars_to_save = []
-            
-            for car in page_results:
-                normalized = normalize_car_id(car.get("Id"))
-                if not normalized:
-                    continue
-
-                car_id_str, _ = normalized
-                if car_id_str not in seen_ids_in_cycle:
-                    seen_ids_in_cycle.add(car_id_str)
-                    new_count += 1
-                else:
-                    repeat_count += 1
-                
-                # Добавляем в список для сохранения в БД (включая обновления)
-                cars_to_save.append(car)
-            
-            # Сохраняем все автомобили со страницы в БД батчем
-            if cars_to_save:
-                saved_count = save_cars_to_db_batch(logger, cars_to_save, collected_at)
-                logger.info(
-                    "Сохранено в БД: %d автомобилей (новых: %d, дублей: %d)",
-                    saved_count, new_count, repeat_count
-                )
-
-            if new_count == 0:
-                all_repeat_count -= 1
-
-            if all_repeat_count < 0:
-                logger.info(
-                    "Повтор дублей! %s (offset %d), переходим к следующему году",
-                    year_range,
-                    offset,
-                )
-                break
-
-            offset += OFFSET_STEP
-            time.sleep(REQUEST_PAUSE_SECONDS)
-        time.sleep(REQUEST_PAUSE_SECONDS)
+async def scrape_trucks_async(logger: logging.Logger, conn: sqlite3.Connection) -> None:
+    cookies_and_headers = load_cookies_and_headers(logger)
+    if cookies_and_headers is None:
+        return
 
+    # Общие на все годы лимит одновременных запросов и темп обращений к API
+    pacer = RequestPacer(MAX_CONCURRENT_REQUESTS)
+
+    # Клиент получаем до старта писателя: если он не создастся, писатель не останется ждать очередь
+    client = await get_client(cookies_and_headers, logger)
+
+    # Страницы всех годов пишутся в БД одной задачей, пока сеть продолжает работать
+    save_queue: asyncio.Queue = asyncio.Queue(maxsize=SAVE_QUEUE_SIZE)
+    writer = asyncio.create_task(db_writer(logger, conn, save_queue))
+    try:
+        # TaskGroup при ошибке одного года отменяет остальные, иначе они повиснут на очереди после остановки писателя
+        async with asyncio.TaskGroup() as tg:
+            for year in range(START_YEAR, MIN_YEAR - 1, -1):
+                tg.create_task(scrape_year(client, pacer, logger, save_queue, year))
+    finally:
+        await save_queue.put(None)
+        await writer
+
+
+async def run_cycles(logger: logging.Logger, conn: sqlite3.Connection) -> None:
+    cycle_number = 0
+    try:
+        while True:
+            cycle_number += 1
+            logger.info("=" * 60)
+            logger.info("Начало цикла парсинга #%d", cycle_number)
+            logger.info("=" * 60)
+
+            start_ts = time.time()
+            try:
+                await scrape_trucks_async(logger, conn)
+            except Exception as exc:
+                logger.error("Ошибка в цикле парсинга: %s", exc, exc_info=True)
+            finally:
+                duration = time.time() - start_ts
+                logger.info("Цикл #%d завершен за %.2f секунд", cycle_number, duration)
+
+            logger.info("Пауза %d секунд перед следующим циклом...", CYCLE_PAUSE)
+            await asyncio.sleep(CYCLE_PAUSE)
+    finally:
+        await close_client()
 
 
 def main() -> None:
     logger = setup_logging()
     logger.info("Старт парсинга авто Encar")
     
-    # Инициализируем базу данных
-    init_database(logger)
-    
-    cycle_number = 0
-    while True:
-        cycle_number += 1
-        logger.info("=" * 60)
-        logger.info("Начало цикла парсинга #%d", cycle_number)
-        logger.info("=" * 60)
-        
-        start_ts = time.time()
-        try:
-            scrape_trucks(logger)
-        except Exception as exc:
-            logger.error("Ошибка в цикле парсинга: %s", exc, exc_info=True)
-        finally:
-            duration = time.time() - start_ts
-            logger.info("Цикл #%d завершен за %.2f секунд", cycle_number, duration)
-        
-        logger.info("Пауза %d секунд перед следующим циклом...", CYCLE_PAUSE)
-        time.sleep(CYCLE_PAUSE)
+    # Инициализируем базу данных, соединение живёт всё время работы
+    conn = init_database(logger)
+    if conn is None:
+        return
+
+    try:
+        # Один event loop на все циклы, чтобы HTTP клиент и его соединения переживали паузы
+        asyncio.run(run_cycles(logger, conn))
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":